@@ -1,10 +1,30 @@
+import hashlib
 import os
+import shlex
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 
-import psycopg2
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, flash, jsonify, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    Response,
+    flash,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider, JSONProvider
 from flask_bcrypt import Bcrypt
+from flask_caching import Cache
 from flask_login import (
     LoginManager,
     UserMixin,
@@ -13,13 +33,38 @@ from flask_login import (
     login_user,
     logout_user,
 )
-from psycopg2.extras import RealDictCursor
+from jinja2.utils import htmlsafe_json_dumps
+from psycopg2.extensions import connection
+from psycopg2.extras import NamedTupleCursor
+from psycopg2.pool import ThreadedConnectionPool
+from werkzeug.exceptions import ServiceUnavailable
 
 load_dotenv()
 
 
-def get_secret(command_str):
-    return subprocess.check_output(command_str.split()).decode().strip()
+@lru_cache(maxsize=None)
+def get_secret(name):
+    """Read secret ``name`` from $NAME, the file at $NAME_FILE or $NAME_COMMAND.
+
+    The plain variable and the file (e.g. a systemd credential or mounted
+    secret) are checked first so workers don't have to spawn a process.
+    """
+    value = os.getenv(name)
+    if value is not None:
+        return value
+
+    path = os.getenv(f"{name}_FILE")
+    if path:
+        with open(path) as f:
+            return f.read().strip()
+
+    command = os.getenv(f"{name}_COMMAND")
+    if not command:
+        raise RuntimeError(f"Set {name}, {name}_FILE or {name}_COMMAND")
+    result = subprocess.run(
+        shlex.split(command), capture_output=True, check=True, text=True
+    )
+    return result.stdout.strip()
 
 
 # Load configuration from environment variables
@@ -27,18 +72,432 @@ host = os.getenv("POSTGRES_HOST")
 port = os.getenv("POSTGRES_PORT")
 user = os.getenv("POSTGRES_USER")
 database = os.getenv("POSTGRES_DATABASE")
-password = get_secret(os.getenv("POSTGRES_PASSWORD_COMMAND"))
-secret_key = get_secret(os.getenv("FLASK_SECRET_KEY_COMMAND"))
+password = get_secret("POSTGRES_PASSWORD")
+secret_key = get_secret("FLASK_SECRET_KEY")
 debug = os.getenv("FLASK_DEBUG", "False").lower() == "true"
 flask_host = os.getenv("FLASK_HOST", "127.0.0.1")
 flask_port = int(os.getenv("FLASK_PORT", "5000"))
 
 
-def get_db_connection():
-    return psycopg2.connect(
-        f"postgresql://{user}:{password}@{host}:{port}/{database}",
-        cursor_factory=RealDictCursor,
+# One row per level, with that level's radicals already aggregated
+SQL_RADICALS_LIST = """
+    SELECT level,
+           JSONB_AGG(
+               JSONB_BUILD_OBJECT(
+                   'id', id,
+                   'character', character,
+                   'character_image', character_image,
+                   'meaning', meaning
+               )
+               ORDER BY meaning
+           ) AS items
+    FROM radicals
+    GROUP BY level
+    ORDER BY level
+"""
+
+
+# kanji.onyomi is kept current by a trigger on kanji_readings
+# (migrations/002_add_kanji_onyomi.sql)
+SQL_KANJI_LIST = """
+    SELECT level,
+           JSONB_AGG(
+               JSONB_BUILD_OBJECT(
+                   'id', id,
+                   'character', character,
+                   'meaning', meaning,
+                   'onyomi', onyomi
+               )
+               ORDER BY character
+           ) AS items
+    FROM kanji
+    GROUP BY level
+    ORDER BY level
+"""
+
+
+# One row per level, with that level's vocabulary already aggregated
+SQL_VOCABULARY_LIST = """
+    SELECT level,
+           JSONB_AGG(
+               JSONB_BUILD_OBJECT(
+                   'id', id,
+                   'character', character,
+                   'primary_meaning', primary_meaning,
+                   'reading', reading
+               )
+               ORDER BY character
+           ) AS items
+    FROM vocabulary
+    GROUP BY level
+    ORDER BY level
+"""
+
+
+# Sample 5 random radicals, kanji and vocabulary from level 1 and build the
+# finished test items in a single round trip. Only the ids of the level-1 rows
+# are shuffled; readings and meanings are aggregated for the sampled rows
+# alone. Each group is reviewed in full, then its first two items are repeated
+# in learn mode.
+SQL_TEST_DATA = """
+    WITH modes (mode, id_prefix, mode_order, max_position) AS (
+        VALUES ('review', '', 1, 5), ('learn', 'learn_', 2, 2)
+    ),
+    sampled_radicals AS (
+        SELECT id, COALESCE(NULLIF(character, ''), character_image) AS character,
+               meaning,
+               ROW_NUMBER() OVER (ORDER BY RANDOM()) AS position
+        FROM radicals
+        WHERE id IN (
+            SELECT id FROM radicals WHERE level = 1 ORDER BY RANDOM() LIMIT 5
+        )
+    ),
+    sampled_kanji AS (
+        SELECT k.id, k.character, k.meaning,
+               COALESCE(
+                   ARRAY_AGG(TRIM(kr.reading_text)) FILTER (WHERE TRIM(kr.reading_text) <> ''),
+                   '{}'
+               ) AS readings,
+               ROW_NUMBER() OVER (ORDER BY RANDOM()) AS position
+        FROM kanji k
+        LEFT JOIN kanji_readings kr ON k.id = kr.kanji_id
+        WHERE k.id IN (
+            SELECT id FROM kanji WHERE level = 1 ORDER BY RANDOM() LIMIT 5
+        )
+        GROUP BY k.id, k.character, k.meaning
+    ),
+    sampled_vocabulary AS (
+        SELECT v.id, v.character, v.reading,
+               ARRAY_PREPEND(
+                   v.primary_meaning,
+                   ARRAY_AGG(vam.meaning_text ORDER BY vam.meaning_text)
+                       FILTER (WHERE vam.meaning_text <> '')
+               ) AS meanings,
+               ROW_NUMBER() OVER (ORDER BY RANDOM()) AS position
+        FROM vocabulary v
+        LEFT JOIN vocabulary_alternative_meanings vam ON v.id = vam.vocab_id
+        WHERE v.id IN (
+            SELECT id FROM vocabulary WHERE level = 1 ORDER BY RANDOM() LIMIT 5
+        )
+        GROUP BY v.id, v.character, v.primary_meaning, v.reading
+    ),
+    test_items AS (
+        SELECT m.mode_order, 1 AS type_order, r.position,
+               JSON_BUILD_OBJECT(
+                   'id', m.id_prefix || 'radical_' || r.id,
+                   'type', 'radical',
+                   'character', r.character,
+                   'prompts', JSON_BUILD_ARRAY(
+                       JSON_BUILD_OBJECT('type', 'meaning', 'answer', r.meaning)
+                   ),
+                   'mode', m.mode
+               ) AS item
+        FROM sampled_radicals r
+        JOIN modes m ON r.position <= m.max_position
+        UNION ALL
+        SELECT m.mode_order, 2, k.position,
+               JSON_BUILD_OBJECT(
+                   'id', m.id_prefix || 'kanji_' || k.id,
+                   'type', 'kanji',
+                   'character', k.character,
+                   'prompts', JSON_BUILD_ARRAY(
+                       JSON_BUILD_OBJECT('type', 'meaning', 'answer', k.meaning),
+                       JSON_BUILD_OBJECT('type', 'reading', 'answer', k.readings)
+                   ),
+                   'mode', m.mode
+               )
+        FROM sampled_kanji k
+        JOIN modes m ON k.position <= m.max_position
+        UNION ALL
+        SELECT m.mode_order, 3, v.position,
+               JSON_BUILD_OBJECT(
+                   'id', m.id_prefix || 'vocab_' || v.id,
+                   'type', 'vocabulary',
+                   'character', v.character,
+                   'prompts', JSON_BUILD_ARRAY(
+                       JSON_BUILD_OBJECT('type', 'meaning', 'answer', v.meanings),
+                       JSON_BUILD_OBJECT('type', 'reading', 'answer', v.reading)
+                   ),
+                   'mode', m.mode
+               )
+        FROM sampled_vocabulary v
+        JOIN modes m ON v.position <= m.max_position
+    )
+    SELECT JSON_BUILD_OBJECT(
+               'items', COALESCE(
+                   JSON_AGG(item ORDER BY mode_order, type_order, position),
+                   '[]'
+               )
+           )::text AS body
+    FROM test_items
+"""
+
+
+SQL_UPDATE_LAST_LOGIN = "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s"
+
+
+# Bumped by triggers on every content table
+# (migrations/003_add_content_version.sql)
+SQL_CONTENT_VERSION = "SELECT version FROM content_version"
+
+
+# Hot-path statements, PREPAREd once on each pooled connection and run as
+# EXECUTE <name>(...) so Postgres doesn't re-parse and re-plan them per request
+PREPARED_STATEMENTS = {
+    "user_by_id": "SELECT id, username FROM users WHERE id = $1",
+    "user_by_username": (
+        "SELECT id, username, password_hash FROM users WHERE username = $1"
+    ),
+    "radical_detail": """
+        WITH radical_row AS (
+            SELECT character, character_image, meaning, mnemonic, mnemonic_image, url, level
+            FROM radicals
+            WHERE id = $1
+        ),
+        kanji_list AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'id', k.id,
+                               'character', k.character,
+                               'meaning', k.meaning,
+                               'level', k.level
+                           )
+                           ORDER BY k.level, k.character
+                       ),
+                       '[]'
+                   ) AS items
+            FROM kanji k
+            JOIN kanji_radicals kr ON k.id = kr.kanji_id
+            WHERE kr.radical_id = $1
+        )
+        SELECT radical_row.*, kanji_list.items AS kanji_list
+        FROM radical_row, kanji_list
+    """,
+    "kanji_detail": """
+        WITH kanji_row AS (
+            SELECT character, meaning, url, level
+            FROM kanji
+            WHERE id = $1
+        ),
+        readings AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'reading_type', reading_type,
+                               'reading_text', reading_text
+                           )
+                           ORDER BY reading_type, reading_text
+                       ),
+                       '[]'
+                   ) AS items
+            FROM kanji_readings
+            WHERE kanji_id = $1
+        ),
+        mnemonics AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'mnemonic_type', mnemonic_type,
+                               'content', content
+                           )
+                           ORDER BY mnemonic_type
+                       ),
+                       '[]'
+                   ) AS items
+            FROM kanji_mnemonics
+            WHERE kanji_id = $1
+        ),
+        kanji_radicals_list AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'id', r.id,
+                               'character', r.character,
+                               'character_image', r.character_image,
+                               'meaning', r.meaning,
+                               'level', r.level
+                           )
+                           ORDER BY r.level, r.meaning
+                       ),
+                       '[]'
+                   ) AS items
+            FROM radicals r
+            JOIN kanji_radicals kr ON r.id = kr.radical_id
+            WHERE kr.kanji_id = $1
+        ),
+        vocabulary_list AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'id', v.id,
+                               'character', v.character,
+                               'primary_meaning', v.primary_meaning,
+                               'reading', v.reading,
+                               'level', v.level
+                           )
+                           ORDER BY v.level, v.character
+                       ),
+                       '[]'
+                   ) AS items
+            FROM vocabulary v
+            JOIN vocab_kanji_composition vkc ON v.id = vkc.vocab_id
+            WHERE vkc.kanji_id = $1
+        )
+        SELECT kanji_row.*,
+               readings.items AS readings,
+               mnemonics.items AS mnemonics,
+               kanji_radicals_list.items AS radicals,
+               vocabulary_list.items AS vocabulary
+        FROM kanji_row, readings, mnemonics, kanji_radicals_list, vocabulary_list
+    """,
+    "vocab_detail": """
+        WITH vocab_row AS (
+            SELECT character, primary_meaning, reading, url, level
+            FROM vocabulary
+            WHERE id = $1
+        ),
+        alt_meanings AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT('meaning_text', meaning_text)
+                           ORDER BY meaning_text
+                       ),
+                       '[]'
+                   ) AS items
+            FROM vocabulary_alternative_meanings
+            WHERE vocab_id = $1
+        ),
+        explanations AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'explanation_type', explanation_type,
+                               'content', content
+                           )
+                           ORDER BY explanation_type
+                       ),
+                       '[]'
+                   ) AS items
+            FROM vocab_explanations
+            WHERE vocab_id = $1
+        ),
+        kanji_composition AS (
+            SELECT COALESCE(
+                       JSON_AGG(
+                           JSON_BUILD_OBJECT(
+                               'id', k.id,
+                               'character', k.character,
+                               'meaning', k.meaning,
+                               'level', k.level
+                           )
+                           ORDER BY k.level, k.character
+                       ),
+                       '[]'
+                   ) AS items
+            FROM kanji k
+            JOIN vocab_kanji_composition vkc ON k.id = vkc.kanji_id
+            WHERE vkc.vocab_id = $1
+        )
+        SELECT vocab_row.*,
+               alt_meanings.items AS alt_meanings,
+               explanations.items AS explanations,
+               kanji_composition.items AS kanji_composition
+        FROM vocab_row, alt_meanings, explanations, kanji_composition
+    """,
+    # /api/additional-info: the meaning and reading mnemonics as one row
+    "radical_info": """
+        SELECT COALESCE(mnemonic, '') AS meaning, '' AS reading
+        FROM radicals
+        WHERE id = $1
+    """,
+    "kanji_info": """
+        SELECT COALESCE(MAX(content) FILTER (WHERE mnemonic_type = 'meaning'), '') AS meaning,
+               COALESCE(MAX(content) FILTER (WHERE mnemonic_type = 'reading'), '') AS reading
+        FROM kanji_mnemonics
+        WHERE kanji_id = $1
+    """,
+    "vocabulary_info": """
+        SELECT COALESCE(MAX(content) FILTER (WHERE explanation_type = 'meaning'), '') AS meaning,
+               COALESCE(MAX(content) FILTER (WHERE explanation_type = 'reading'), '') AS reading
+        FROM vocab_explanations
+        WHERE vocab_id = $1
+    """,
+}
+
+ADDITIONAL_INFO_STATEMENTS = {
+    "radical": "radical_info",
+    "kanji": "kanji_info",
+    "vocabulary": "vocabulary_info",
+}
+
+
+class PreparingConnection(connection):
+    # Set once PREPARED_STATEMENTS exist in this connection's session
+    statements_prepared = False
+
+
+def prepare_statements(conn):
+    # Sent as one multi-statement string so preparing a new connection costs
+    # a single round trip rather than one per statement
+    cursor = conn.cursor()
+    cursor.execute(
+        ";".join(
+            f"PREPARE {name} AS {statement}"
+            for name, statement in PREPARED_STATEMENTS.items()
+        )
     )
+    conn.commit()
+    conn.statements_prepared = True
+
+
+DB_POOL_MAX_CONNECTIONS = 20
+# Seconds to wait for a free connection before failing the request
+DB_POOL_CHECKOUT_TIMEOUT = 10
+
+db_pool = ThreadedConnectionPool(
+    minconn=2,
+    maxconn=DB_POOL_MAX_CONNECTIONS,
+    dsn=f"postgresql://{user}:{password}@{host}:{port}/{database}",
+    cursor_factory=NamedTupleCursor,
+    connection_factory=PreparingConnection,
+)
+# getconn() raises PoolError once every connection is checked out; callers
+# wait on this instead
+db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+
+# Runs writes that the response doesn't need to wait for
+background_executor = ThreadPoolExecutor(max_workers=2)
+
+
+@contextmanager
+def get_db_connection():
+    if not db_pool_slots.acquire(timeout=DB_POOL_CHECKOUT_TIMEOUT):
+        raise ServiceUnavailable("Timed out waiting for a database connection")
+    try:
+        conn = db_pool.getconn()
+    except Exception:
+        db_pool_slots.release()
+        raise
+
+    try:
+        if not conn.statements_prepared:
+            prepare_statements(conn)
+        yield conn
+    finally:
+        # Discard any open transaction so the next borrower starts clean; a
+        # connection that can't be rolled back is closed rather than reused.
+        # The failure is only logged, so it doesn't mask the caller's own.
+        discard = conn.closed
+        try:
+            if not discard:
+                conn.rollback()
+        except Exception:
+            discard = True
+            app.logger.exception("Failed to roll back a pooled connection")
+        finally:
+            db_pool.putconn(conn, close=bool(discard))
+            db_pool_slots.release()
 
 
 class User(UserMixin):
@@ -48,40 +507,63 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username FROM users WHERE id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        conn.close()
-        if user_data:
-            return User(user_data["id"], user_data["username"])
-        return None
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("EXECUTE user_by_id(%s)", (user_id,))
+            user_data = cursor.fetchone()
+            if user_data:
+                return User(user_data.id, user_data.username)
+            return None
 
     @staticmethod
     def authenticate(username, password):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, username, password_hash FROM users WHERE username = %s",
-            (username,),
-        )
-        user_data = cursor.fetchone()
-        if user_data and bcrypt.check_password_hash(
-            user_data["password_hash"], password
-        ):
-            # Update last_login
-            cursor.execute(
-                "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s",
-                (user_data["id"],),
-            )
-            conn.commit()
-            conn.close()
-            return User(user_data["id"], user_data["username"])
-        conn.close()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("EXECUTE user_by_username(%s)", (username,))
+            user_data = cursor.fetchone()
+
+        # The connection is back in the pool before the (deliberately slow)
+        # bcrypt check runs
+        if user_data and bcrypt.check_password_hash(user_data.password_hash, password):
+            background_executor.submit(record_last_login, user_data.id)
+            return User(user_data.id, user_data.username)
         return None
 
 
+def record_last_login(user_id):
+    # Runs on background_executor, where nobody reads the future's result, so
+    # failures have to be logged here to be seen at all
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SQL_UPDATE_LAST_LOGIN, (user_id,))
+            conn.commit()
+    except Exception:
+        app.logger.exception("Failed to record last_login for user %s", user_id)
+
+
+class ORJSONProvider(JSONProvider):
+    """Serve jsonify() and the templates' tojson filter through orjson."""
+
+    # Keys keep insertion order unless a caller asks for sort_keys=True
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact; separators and indent are ignored.
+        # Non-str keys (e.g. int levels) are stringified as the stdlib does.
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(
+            obj, default=DefaultJSONProvider.default, option=option
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = secret_key
 
 bcrypt = Bcrypt(app)
@@ -90,225 +572,254 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
+# Redirect targets, resolved once instead of through url_for on every request
+RADICALS_URL = "/radicals"
+LOGIN_URL = "/login"
+
+# List page fragments are keyed by the content version, so a write to the
+# content tables retires them without explicit invalidation
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+LIST_PAGE_CACHE_TIMEOUT = 300
+
+CONTENT_VERSION_CACHE_TIMEOUT = 60
+PAGE_MAX_AGE = 60
+
+
+def get_app_version():
+    """Return a token identifying this deploy, for folding into page ETags.
+
+    ``APP_BUILD_ID`` wins when set; otherwise the token hashes the contents of
+    this module and the templates, so a release that changes the markup
+    invalidates every cached page while every instance of one release, wherever
+    it is installed, agrees on the token.
+    """
+    build_id = os.getenv("APP_BUILD_ID")
+    if build_id:
+        return build_id
+
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.abspath(__file__)] + sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(template_dir)
+        for name in names
+    )
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.relpath(path, app.root_path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+APP_VERSION = get_app_version()
+
+
+def get_content_version():
+    version = cache.get("content_version")
+    if version is None:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SQL_CONTENT_VERSION)
+            version = cursor.fetchone().version
+        cache.set("content_version", version, timeout=CONTENT_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def list_page_levels(query, key_prefix):
+    """Yield ``(level, items_json)`` pairs for a list page.
+
+    ``query`` must return ``(level, items)`` rows. Each level's items are
+    serialized once per content version and the fragment is shared by every
+    user. On a miss the rows (one per level) are read up front and each
+    fragment is serialized and cached as it streams past.
+    """
+    version = get_content_version()
+    levels_key = f"{key_prefix}:levels:{version}"
+    levels = cache.get(levels_key)
+    if levels is not None:
+        fragments = cache.get_many(
+            *(f"{key_prefix}:{level}:{version}" for level in levels)
+        )
+        if all(fragment is not None for fragment in fragments):
+            yield from zip(levels, fragments)
+            return
+
+    # Read every level before yielding, so the pooled connection isn't held
+    # while a slow client downloads the rendered page
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        rows = cursor.fetchall()
+
+    levels = []
+    for level, items in rows:
+        fragment = htmlsafe_json_dumps(items, dumps=app.json.dumps)
+        cache.set(
+            f"{key_prefix}:{level}:{version}",
+            fragment,
+            timeout=LIST_PAGE_CACHE_TIMEOUT,
+        )
+        levels.append(level)
+        yield level, fragment
+
+    cache.set(levels_key, levels, timeout=LIST_PAGE_CACHE_TIMEOUT)
+
+
+def stream_list_page(template_name, query):
+    """Stream a list page, handing the template its levels as ``levels``.
+
+    The page shell is rendered per request; the per-level data comes from
+    :func:`list_page_levels`, so the rendered page is never held in memory as
+    a whole.
+    """
+
+    def generate():
+        context = {"levels": list_page_levels(query, request.endpoint)}
+        app.update_template_context(context)
+        stream = app.jinja_env.get_template(template_name).stream(context)
+        stream.enable_buffering(size=20)
+        yield from stream
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
+
+
+def conditional_page(view):
+    """Serve ``view`` with an ETag derived from the deploy and content versions.
+
+    A client revalidating with a matching If-None-Match gets a 304 before the
+    view queries or renders anything.
+    """
+
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        etag_source = (
+            f"{APP_VERSION}:{request.path}:{current_user.id}:{get_content_version()}"
+        )
+        etag = hashlib.sha1(etag_source.encode()).hexdigest()
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"private, max-age={PAGE_MAX_AGE}"
+        return response
+
+    return decorated_view
+
+
+# How long a session may rebuild its user without checking the database
+USER_REVALIDATE_SECONDS = 300
+
+
+def remember_user(user):
+    session["username"] = user.username
+    session["user_checked_at"] = time.time()
+
+
+def forget_user():
+    session.pop("username", None)
+    session.pop("user_checked_at", None)
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(user_id)
+    # The username is stored in the signed session at login, so most requests
+    # rebuild the user without a database round trip. Every
+    # USER_REVALIDATE_SECONDS the user is reloaded, so a deleted or renamed
+    # account doesn't outlive its session indefinitely.
+    username = session.get("username")
+    checked_at = session.get("user_checked_at", 0)
+    if username is not None and time.time() - checked_at < USER_REVALIDATE_SECONDS:
+        return User(user_id, username)
+
+    user = User.get(user_id)
+    if user is None:
+        forget_user()
+    else:
+        remember_user(user)
+    return user
 
 
 @app.route("/")
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for("radicals"))
-    return redirect(url_for("login"))
+        return redirect(RADICALS_URL)
+    return redirect(LOGIN_URL)
 
 
 @app.route("/radicals")
 @login_required
+@conditional_page
 def radicals():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT id, character, character_image, meaning, level
-        FROM radicals
-        ORDER BY level, meaning
-    """)
-
-    radicals_list = cursor.fetchall()
-
-    # Group by level
-    radicals_by_level = {}
-    for radical in radicals_list:
-        level = radical["level"]
-        if level not in radicals_by_level:
-            radicals_by_level[level] = []
-        radicals_by_level[level].append(radical)
-
-    conn.close()
-    return render_template("radicals.html", radicals_by_level=radicals_by_level)
+    return stream_list_page("radicals.html", SQL_RADICALS_LIST)
 
 
 @app.route("/radicals/<int:radical_id>")
 @login_required
+@conditional_page
 def radical_detail(radical_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Get radical details
-    cursor.execute(
-        """
-        SELECT character, character_image, meaning, mnemonic, mnemonic_image, url, level
-        FROM radicals
-        WHERE id = %s
-    """,
-        (radical_id,),
-    )
+        # Radical details plus the kanji that use it, in a single round trip
+        cursor.execute("EXECUTE radical_detail(%s)", (radical_id,))
 
-    radical = cursor.fetchone()
+        radical = cursor.fetchone()
 
     if not radical:
         return "Radical not found", 404
 
-    # Get kanji that use this radical
-    cursor.execute(
-        """
-        SELECT k.id, k.character, k.meaning, k.level
-        FROM kanji k
-        JOIN kanji_radicals kr ON k.id = kr.kanji_id
-        WHERE kr.radical_id = %s
-        ORDER BY k.level, k.character
-    """,
-        (radical_id,),
-    )
-
-    kanji_list = cursor.fetchall()
-
-    conn.close()
     return render_template(
-        "radical_detail.html", radical=radical, kanji_list=kanji_list
+        "radical_detail.html", radical=radical, kanji_list=radical.kanji_list
     )
 
 
 @app.route("/kanji")
 @login_required
+@conditional_page
 def kanji():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT k.id, k.character, k.meaning, k.level,
-               STRING_AGG(CASE WHEN kr.reading_type = 'on' THEN kr.reading_text END, ', ') as onyomi
-        FROM kanji k
-        LEFT JOIN kanji_readings kr ON k.id = kr.kanji_id
-        GROUP BY k.id, k.character, k.meaning, k.level
-        ORDER BY k.level, k.character
-    """)
-
-    kanji_list = cursor.fetchall()
-
-    # Group by level
-    kanji_by_level = {}
-    for kanji in kanji_list:
-        level = kanji["level"]
-        if level not in kanji_by_level:
-            kanji_by_level[level] = []
-        kanji_by_level[level].append(kanji)
-
-    conn.close()
-    return render_template("kanji.html", kanji_by_level=kanji_by_level)
+    return stream_list_page("kanji.html", SQL_KANJI_LIST)
 
 
 @app.route("/kanji/<int:kanji_id>")
 @login_required
+@conditional_page
 def kanji_detail(kanji_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Get kanji details
-    cursor.execute(
-        """
-        SELECT character, meaning, url, level
-        FROM kanji
-        WHERE id = %s
-    """,
-        (kanji_id,),
-    )
+        # Kanji details, readings, mnemonics, component radicals and the
+        # vocabulary using it, in a single round trip. This is deliberately
+        # not fanned out as parallel queries over several pooled connections:
+        # one round trip already beats max(query time), and a request that
+        # holds one connection while blocking on four more can deadlock the
+        # pool once enough such requests arrive together.
+        cursor.execute("EXECUTE kanji_detail(%s)", (kanji_id,))
 
-    kanji = cursor.fetchone()
+        kanji = cursor.fetchone()
 
     if not kanji:
         return "Kanji not found", 404
 
-    # Get readings
-    cursor.execute(
-        """
-        SELECT reading_type, reading_text
-        FROM kanji_readings
-        WHERE kanji_id = %s
-        ORDER BY reading_type, reading_text
-    """,
-        (kanji_id,),
-    )
-
-    readings = cursor.fetchall()
-
-    # Get mnemonics
-    cursor.execute(
-        """
-        SELECT mnemonic_type, content
-        FROM kanji_mnemonics
-        WHERE kanji_id = %s
-        ORDER BY mnemonic_type
-    """,
-        (kanji_id,),
-    )
-
-    mnemonics = cursor.fetchall()
-
-    # Get radicals that make up this kanji
-    cursor.execute(
-        """
-        SELECT r.id, r.character, r.character_image, r.meaning, r.level
-        FROM radicals r
-        JOIN kanji_radicals kr ON r.id = kr.radical_id
-        WHERE kr.kanji_id = %s
-        ORDER BY r.level, r.meaning
-    """,
-        (kanji_id,),
-    )
-
-    radicals = cursor.fetchall()
-
-    # Get vocabulary that uses this kanji
-    cursor.execute(
-        """
-        SELECT v.id, v.character, v.primary_meaning, v.reading, v.level
-        FROM vocabulary v
-        JOIN vocab_kanji_composition vkc ON v.id = vkc.vocab_id
-        WHERE vkc.kanji_id = %s
-        ORDER BY v.level, v.character
-    """,
-        (kanji_id,),
-    )
-
-    vocabulary = cursor.fetchall()
-
-    conn.close()
     return render_template(
         "kanji_detail.html",
         kanji=kanji,
-        readings=readings,
-        mnemonics=mnemonics,
-        radicals=radicals,
-        vocabulary=vocabulary,
+        readings=kanji.readings,
+        mnemonics=kanji.mnemonics,
+        radicals=kanji.radicals,
+        vocabulary=kanji.vocabulary,
     )
 
 
 @app.route("/vocabulary")
 @login_required
+@conditional_page
 def vocabulary():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT id, character, primary_meaning, reading, level
-        FROM vocabulary
-        ORDER BY level, character
-    """)
-
-    vocab_list = cursor.fetchall()
-
-    # Group by level
-    vocab_by_level = {}
-    for vocab in vocab_list:
-        level = vocab["level"]
-        if level not in vocab_by_level:
-            vocab_by_level[level] = []
-        vocab_by_level[level].append(vocab)
-
-    conn.close()
-    return render_template("vocabulary.html", vocab_by_level=vocab_by_level)
+    return stream_list_page("vocabulary.html", SQL_VOCABULARY_LIST)
 
 
 @app.route("/test")
@@ -320,64 +831,17 @@ def test():
 @app.route("/api/additional-info/<item_type>/<int:item_id>")
 @login_required
 def get_additional_info(item_type, item_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     info = {"meaning": "", "reading": ""}
 
-    if item_type == "radical":
-        cursor.execute(
-            """
-            SELECT character, character_image, meaning, mnemonic, mnemonic_image
-            FROM radicals
-            WHERE id = %s
-        """,
-            (item_id,),
-        )
-        result = cursor.fetchone()
-
-        if result and result["mnemonic"]:
-            info["meaning"] = result["mnemonic"]
-
-    elif item_type == "kanji":
-        # Get mnemonics by type
-        cursor.execute(
-            """
-            SELECT mnemonic_type, content
-            FROM kanji_mnemonics
-            WHERE kanji_id = %s
-            ORDER BY mnemonic_type
-        """,
-            (item_id,),
-        )
-        mnemonics = cursor.fetchall()
-
-        for m in mnemonics:
-            if m["mnemonic_type"] == "meaning":
-                info["meaning"] = m["content"]
-            elif m["mnemonic_type"] == "reading":
-                info["reading"] = m["content"]
-
-    elif item_type == "vocabulary":
-        # Get explanations by type
-        cursor.execute(
-            """
-            SELECT explanation_type, content
-            FROM vocab_explanations
-            WHERE vocab_id = %s
-            ORDER BY explanation_type
-        """,
-            (item_id,),
-        )
-        explanations = cursor.fetchall()
-
-        for e in explanations:
-            if e["explanation_type"] == "meaning":
-                info["meaning"] = e["content"]
-            elif e["explanation_type"] == "reading":
-                info["reading"] = e["content"]
+    statement = ADDITIONAL_INFO_STATEMENTS.get(item_type)
+    if statement:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"EXECUTE {statement}(%s)", (item_id,))
+            result = cursor.fetchone()
 
-    conn.close()
+        if result:
+            info = result._asdict()
 
     return jsonify(info)
 
@@ -385,236 +849,54 @@ def get_additional_info(item_type, item_id):
 @app.route("/api/test-data")
 @login_required
 def get_test_data():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Get 5 random radicals from level 1
-    cursor.execute("""
-        SELECT id, character, meaning
-        FROM radicals
-        WHERE level = 1
-        ORDER BY RANDOM()
-        LIMIT 5
-    """)
-    radicals = cursor.fetchall()
-
-    # Get 5 random kanji with all readings from level 1
-    cursor.execute("""
-        SELECT k.id, k.character, k.meaning,
-               STRING_AGG(kr.reading_text, ', ') as readings
-        FROM kanji k
-        LEFT JOIN kanji_readings kr ON k.id = kr.kanji_id
-        WHERE k.level = 1
-        GROUP BY k.id, k.character, k.meaning
-        ORDER BY RANDOM()
-        LIMIT 5
-    """)
-    kanji = cursor.fetchall()
-
-    # Get 5 random vocabulary from level 1 with alternative meanings
-    cursor.execute("""
-        SELECT v.id, v.character, v.primary_meaning, v.reading,
-               ARRAY_AGG(vam.meaning_text ORDER BY vam.meaning_text) as alternative_meanings
-        FROM vocabulary v
-        LEFT JOIN vocabulary_alternative_meanings vam ON v.id = vam.vocab_id
-        WHERE v.level = 1
-        GROUP BY v.id, v.character, v.primary_meaning, v.reading
-        ORDER BY RANDOM()
-        LIMIT 5
-    """)
-    vocabulary = cursor.fetchall()
-
-    conn.close()
-
-    # Build test items
-    test_items = []
-
-    # Add radicals
-    for radical in radicals:
-        test_items.append(
-            {
-                "id": f"radical_{radical['id']}",
-                "type": "radical",
-                "character": radical["character"] or radical["character_image"],
-                "prompts": [{"type": "meaning", "answer": radical["meaning"]}],
-                "mode": "review",
-            }
-        )
-
-    # Add kanji
-    for k in kanji:
-        readings_list = [r.strip() for r in k["readings"].split(",") if r.strip()]
-        test_items.append(
-            {
-                "id": f"kanji_{k['id']}",
-                "type": "kanji",
-                "character": k["character"],
-                "prompts": [
-                    {"type": "meaning", "answer": k["meaning"]},
-                    {"type": "reading", "answer": readings_list},
-                ],
-                "mode": "review",
-            }
-        )
-
-    # Add vocabulary
-    for v in vocabulary:
-        # Combine primary meaning with alternative meanings
-        all_meanings = [v["primary_meaning"]]
-        if v["alternative_meanings"]:
-            all_meanings.extend([alt for alt in v["alternative_meanings"] if alt])
-
-        test_items.append(
-            {
-                "id": f"vocab_{v['id']}",
-                "type": "vocabulary",
-                "character": v["character"],
-                "prompts": [
-                    {"type": "meaning", "answer": all_meanings},
-                    {"type": "reading", "answer": v["reading"]},
-                ],
-                "mode": "review",
-            }
-        )
-
-    # Add example learn items
-    # Learn radicals
-    for i in range(2):
-        radical = radicals[i]
-        test_items.append(
-            {
-                "id": f"learn_radical_{radical['id']}",
-                "type": "radical",
-                "character": radical["character"] or radical["character_image"],
-                "prompts": [{"type": "meaning", "answer": radical["meaning"]}],
-                "mode": "learn",
-            }
-        )
-
-    # Learn kanji
-    for i in range(2):
-        k = kanji[i]
-        readings_list = [r.strip() for r in k["readings"].split(",") if r.strip()]
-        test_items.append(
-            {
-                "id": f"learn_kanji_{k['id']}",
-                "type": "kanji",
-                "character": k["character"],
-                "prompts": [
-                    {"type": "meaning", "answer": k["meaning"]},
-                    {"type": "reading", "answer": readings_list},
-                ],
-                "mode": "learn",
-            }
-        )
-
-    # Learn vocabulary
-    for i in range(2):
-        v = vocabulary[i]
-        all_meanings = [v["primary_meaning"]]
-        if v["alternative_meanings"]:
-            all_meanings.extend([alt for alt in v["alternative_meanings"] if alt])
-        test_items.append(
-            {
-                "id": f"learn_vocab_{v['id']}",
-                "type": "vocabulary",
-                "character": v["character"],
-                "prompts": [
-                    {"type": "meaning", "answer": all_meanings},
-                    {"type": "reading", "answer": v["reading"]},
-                ],
-                "mode": "learn",
-            }
-        )
-
-    # Items are now in order: radicals (5), kanji (5), vocabulary (5)
-    # Each group is randomized within itself due to SQL ORDER BY RANDOM()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_TEST_DATA)
+        body = cursor.fetchone().body
 
-    return jsonify({"items": test_items})
+    # Postgres has already serialized the response, so it is passed through
+    # as-is. Items are in order: review radicals (5), kanji (5),
+    # vocabulary (5), then learn radicals (2), kanji (2), vocabulary (2)
+    return Response(body, mimetype="application/json")
 
 
 @app.route("/vocabulary/<int:vocab_id>")
 @login_required
+@conditional_page
 def vocab_detail(vocab_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Get vocabulary details
-    cursor.execute(
-        """
-        SELECT character, primary_meaning, reading, url, level
-        FROM vocabulary
-        WHERE id = %s
-    """,
-        (vocab_id,),
-    )
+        # Vocabulary details, alternative meanings, explanations and kanji
+        # composition, in a single round trip
+        cursor.execute("EXECUTE vocab_detail(%s)", (vocab_id,))
 
-    vocab = cursor.fetchone()
+        vocab = cursor.fetchone()
 
     if not vocab:
         return "Vocabulary not found", 404
 
-    # Get alternative meanings
-    cursor.execute(
-        """
-        SELECT meaning_text
-        FROM vocabulary_alternative_meanings
-        WHERE vocab_id = %s
-        ORDER BY meaning_text
-    """,
-        (vocab_id,),
-    )
-
-    alt_meanings = cursor.fetchall()
-
-    # Get explanations
-    cursor.execute(
-        """
-        SELECT explanation_type, content
-        FROM vocab_explanations
-        WHERE vocab_id = %s
-        ORDER BY explanation_type
-    """,
-        (vocab_id,),
-    )
-
-    explanations = cursor.fetchall()
-
-    # Get kanji composition
-    cursor.execute(
-        """
-        SELECT k.id, k.character, k.meaning, k.level
-        FROM kanji k
-        JOIN vocab_kanji_composition vkc ON k.id = vkc.kanji_id
-        WHERE vkc.vocab_id = %s
-        ORDER BY k.level, k.character
-    """,
-        (vocab_id,),
-    )
-
-    kanji_composition = cursor.fetchall()
-
-    conn.close()
     return render_template(
         "vocab_detail.html",
         vocab=vocab,
-        alt_meanings=alt_meanings,
-        explanations=explanations,
-        kanji_composition=kanji_composition,
+        alt_meanings=vocab.alt_meanings,
+        explanations=vocab.explanations,
+        kanji_composition=vocab.kanji_composition,
     )
 
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for("radicals"))
+        return redirect(RADICALS_URL)
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
         user = User.authenticate(username, password)
         if user:
             login_user(user)
-            return redirect(url_for("radicals"))
+            remember_user(user)
+            return redirect(RADICALS_URL)
         else:
             flash("Invalid username or password")
     return render_template("login.html")
@@ -624,7 +906,8 @@ def login():
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("login"))
+    forget_user()
+    return redirect(LOGIN_URL)
 
 
 if __name__ == "__main__":
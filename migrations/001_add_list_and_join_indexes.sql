@@ -0,0 +1,55 @@
+-- Indexes backing the list pages' ORDER BY level, ... and the join-table
+-- lookups made by the detail pages and /api/additional-info.
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so apply
+-- this file with autocommit on, e.g.:
+--
+--   psql "$DATABASE_URL" -f migrations/001_add_list_and_join_indexes.sql
+--
+-- A CREATE INDEX CONCURRENTLY that fails or is cancelled leaves an INVALID
+-- index behind, and IF NOT EXISTS makes a re-run skip it silently. Before
+-- re-running after a failure, list invalid indexes:
+--
+--   SELECT indexrelid::regclass FROM pg_index WHERE NOT indisvalid;
+--
+-- and DROP INDEX CONCURRENTLY (or REINDEX INDEX CONCURRENTLY) each of them.
+
+-- List pages
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_radicals_level_meaning
+    ON radicals (level, meaning) INCLUDE (id, character, character_image);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_level_character
+    ON kanji (level, character) INCLUDE (id, meaning);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vocabulary_level_character
+    ON vocabulary (level, character) INCLUDE (id, primary_meaning, reading);
+
+-- Many-to-many tables are traversed from both sides
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_radicals_radical_kanji
+    ON kanji_radicals (radical_id, kanji_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_radicals_kanji_radical
+    ON kanji_radicals (kanji_id, radical_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vocab_kanji_composition_kanji_vocab
+    ON vocab_kanji_composition (kanji_id, vocab_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vocab_kanji_composition_vocab_kanji
+    ON vocab_kanji_composition (vocab_id, kanji_id);
+
+-- Per-item child tables
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_readings_kanji_id
+    ON kanji_readings (kanji_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_mnemonics_kanji_id
+    ON kanji_mnemonics (kanji_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vocabulary_alternative_meanings_vocab_id
+    ON vocabulary_alternative_meanings (vocab_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vocab_explanations_vocab_id
+    ON vocab_explanations (vocab_id);
+
+ANALYZE radicals, kanji, vocabulary, kanji_radicals, vocab_kanji_composition,
+    kanji_readings, kanji_mnemonics, vocabulary_alternative_meanings,
+    vocab_explanations;
@@ -0,0 +1,65 @@
+-- Denormalize each kanji's on'yomi readings into kanji.onyomi so the /kanji
+-- list doesn't have to join and aggregate kanji_readings on every request.
+-- A trigger on kanji_readings keeps the column current.
+--
+-- The list index from 001 is then rebuilt with onyomi in its INCLUDE list so
+-- /kanji stays an index-only scan. That step uses CONCURRENTLY, so apply this
+-- file with autocommit on (psql's default), e.g.:
+--
+--   psql "$DATABASE_URL" -f migrations/002_add_kanji_onyomi.sql
+
+BEGIN;
+
+ALTER TABLE kanji ADD COLUMN IF NOT EXISTS onyomi TEXT;
+
+CREATE OR REPLACE FUNCTION refresh_kanji_onyomi(target_kanji_id INTEGER)
+RETURNS void AS $$
+    UPDATE kanji
+    SET onyomi = (
+        SELECT STRING_AGG(reading_text, ', ')
+        FROM kanji_readings
+        WHERE kanji_id = target_kanji_id AND reading_type = 'on'
+    )
+    WHERE id = target_kanji_id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION kanji_readings_refresh_onyomi()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_kanji_onyomi(OLD.kanji_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_kanji_onyomi(NEW.kanji_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS kanji_readings_refresh_onyomi ON kanji_readings;
+CREATE TRIGGER kanji_readings_refresh_onyomi
+    AFTER INSERT OR UPDATE OR DELETE ON kanji_readings
+    FOR EACH ROW EXECUTE FUNCTION kanji_readings_refresh_onyomi();
+
+-- Backfill existing kanji
+UPDATE kanji k
+SET onyomi = r.onyomi
+FROM (
+    SELECT kanji_id, STRING_AGG(reading_text, ', ') AS onyomi
+    FROM kanji_readings
+    WHERE reading_type = 'on'
+    GROUP BY kanji_id
+) r
+WHERE k.id = r.kanji_id;
+
+COMMIT;
+
+-- Replaces idx_kanji_level_character from 001. The new index is built before
+-- the old one is dropped so the list query is never left without one. See
+-- 001 for recovering from a failed concurrent build.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_kanji_level_character_onyomi
+    ON kanji (level, character) INCLUDE (id, meaning, onyomi);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_kanji_level_character;
+
+ANALYZE kanji;
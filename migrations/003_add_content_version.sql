@@ -0,0 +1,55 @@
+-- A single-row counter bumped by any write to the WaniKani content tables.
+-- The app folds it into the ETag of list and detail pages, so browsers can
+-- revalidate with a cheap 304 until the content actually changes.
+--
+--   psql "$DATABASE_URL" -f migrations/003_add_content_version.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS content_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO content_version (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_content_version()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE content_version
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    content_table TEXT;
+BEGIN
+    FOREACH content_table IN ARRAY ARRAY[
+        'radicals',
+        'kanji',
+        'vocabulary',
+        'kanji_readings',
+        'kanji_mnemonics',
+        'kanji_radicals',
+        'vocabulary_alternative_meanings',
+        'vocab_explanations',
+        'vocab_kanji_composition'
+    ] LOOP
+        EXECUTE format(
+            'DROP TRIGGER IF EXISTS bump_content_version ON %I',
+            content_table
+        );
+        EXECUTE format(
+            'CREATE TRIGGER bump_content_version '
+            'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION bump_content_version()',
+            content_table
+        );
+    END LOOP;
+END;
+$$;
+
+COMMIT;